@@ -7,8 +7,11 @@ Saída: ./saida/matriz_consolidada.xlsx
 Convertidos: ./convertidos/
 
 IMPORTANTE:
-- Conversão .xls usa Excel via COM (pywin32). Alguns arquivos podem travar por prompts.
-- Este script usa TIMEOUT e mata o Excel do arquivo travado, seguindo para o próximo.
+- Conversão .xls usa o LibreOffice headless (soffice), em lote, quando disponível.
+- Se o LibreOffice não estiver instalado (ou falhar), cai para o Excel via COM (pywin32).
+  Alguns arquivos podem travar por prompts.
+- Este script usa TIMEOUT e mata o Excel do arquivo travado (só a instância aberta pelo
+  próprio script), seguindo para o próximo.
 
 Mapeamento (linhas a partir da 11):
 - Tag Equipamento: B (fill down)
@@ -23,14 +26,23 @@ Mapeamento (linhas a partir da 11):
 
 from __future__ import annotations
 
+import os
 import re
-import time
+import functools
+import hashlib
+import shutil
 import subprocess
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Iterable, Optional, List, Tuple
+from typing import Optional, List, Tuple
 
 import pandas as pd
-from openpyxl import load_workbook
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils import column_index_from_string
 
 
 # =========================
@@ -41,12 +53,38 @@ INPUT_DIR = BASE_DIR / "planilhas"
 OUTPUT_DIR = BASE_DIR / "saida"
 OUTPUT_FILE = OUTPUT_DIR / "matriz_consolidada.xlsx"
 CONVERTED_DIR = BASE_DIR / "convertidos"
+CACHE_DIR = BASE_DIR / ".cache"
+
+# Incrementar quando a regra de extração mudar (invalida o cache em .cache/)
+CACHE_VERSION = 2
+
+INPUT_EXTENSIONS = {".xls", ".xlsx", ".xlsm"}
 
 START_ROW = 11
 
+# Processos usados na leitura das planilhas (None => um por núcleo)
+MAX_WORKERS: Optional[int] = None
+
 # Timeout por arquivo .xls durante a conversão (segundos)
 XLS_CONVERT_TIMEOUT_SEC = 40
 
+# LibreOffice headless para conversão .xls -> .xlsx (None => usa só o Excel/COM)
+SOFFICE_BIN = (
+    shutil.which("soffice")
+    or shutil.which("soffice.exe")
+    or next(
+        (
+            str(p)
+            for p in (
+                Path(r"C:\Program Files\LibreOffice\program\soffice.exe"),
+                Path(r"C:\Program Files (x86)\LibreOffice\program\soffice.exe"),
+            )
+            if p.exists()
+        ),
+        None,
+    )
+)
+
 COLS_EQUIP_TAG = ["B"]
 COLS_EQUIP_DESC = ["C", "D"]
 
@@ -71,7 +109,46 @@ ALL_RELEVANT_COLS = sorted(
     )
 )
 
+FOOTER_CHECK_COLS = ["A", "B", "C", "D", "E", "H", "M", "O", "T", "Z", "AA"]
+
+# Índices (0-based) das colunas; são também os rótulos das colunas lidas por read_sheet
+IDX = {
+    c: column_index_from_string(c) - 1
+    for c in sorted(set(ALL_RELEVANT_COLS + FOOTER_CHECK_COLS))
+}
+MAX_COL = max(IDX.values()) + 1
+
+EQUIP_TAG_IDX = tuple(IDX[c] for c in COLS_EQUIP_TAG)
+EQUIP_DESC_IDX = tuple(IDX[c] for c in COLS_EQUIP_DESC)
+FONTE_TAG_IDX = tuple(IDX[c] for c in COLS_FONTE_TAG)
+FONTE_DESC_IDX = tuple(IDX[c] for c in COLS_FONTE_DESC)
+COMO_BLOQUEAR_IDX = tuple(IDX[c] for c in COLS_COMO_BLOQUEAR)
+ONDE_BLOQUEAR_IDX = tuple(IDX[c] for c in COLS_ONDE_BLOQUEAR)
+TIPO_BLOQUEIO_IDX = tuple(IDX[c] for c in COLS_TIPO_BLOQUEIO)
+COMO_DESBLOQUEAR_IDX = tuple(IDX[c] for c in COLS_COMO_DESBLOQUEAR)
+RELEVANT_IDX = tuple(IDX[c] for c in ALL_RELEVANT_COLS)
+FOOTER_CHECK_IDX = tuple(IDX[c] for c in FOOTER_CHECK_COLS)
+NORMALIZED_IDX = tuple(sorted(set(RELEVANT_IDX + FOOTER_CHECK_IDX)))
+
+OUTPUT_COLUMNS = [
+    "Arquivo de Origem",
+    "Tag do Equipamento",
+    "Descrição do Equipamento",
+    "Tag da Fonte de Energia",
+    "Descrição da Fonte de Energia",
+    "Como Bloquear",
+    "Onde Bloquear / TAG",
+    "Tipo de Bloqueio",
+    "Como Desbloquear",
+]
+
+OUTPUT_SCHEMA = pa.schema([(c, pa.string()) for c in OUTPUT_COLUMNS])
+
 EMPTY_TOKENS = {"-", "—", "–", "n/a", "na", "null", "none"}
+_EMPTY_TOKENS = frozenset(EMPTY_TOKENS)
+_EMPTY_TOKENS_MAX_LEN = max(len(t) for t in _EMPTY_TOKENS)
+
+_WS_RE = re.compile(r"\s+")
 
 FOOTER_KEYWORDS = [
     "LEGENDA",
@@ -85,87 +162,86 @@ FOOTER_KEYWORDS = [
     "PÁGINA",
     "PAGINA",
 ]
+_FOOTER_RE = re.compile("|".join(re.escape(k) for k in FOOTER_KEYWORDS))
 
 
 # =========================
 # Utilitários
 # =========================
-def normalize_cell(value) -> Optional[str]:
-    if value is None:
-        return None
-
-    if isinstance(value, (int, float)):
-        if isinstance(value, float) and value.is_integer():
-            value = int(value)
-        s = str(value)
-    else:
-        s = str(value)
-
-    s = s.replace("\n", " ").replace("\r", " ")
-    s = re.sub(r"\s+", " ", s).strip()
+@functools.lru_cache(maxsize=65536)
+def _normalize_str(s: str) -> Optional[str]:
+    # Cacheado: as matrizes repetem muito os mesmos textos ("Tag", "-", status...)
+    # Só roda o regex se houver espaço duplo ou outro whitespace (\n, \r, \t...)
+    if "  " in s or not s.isprintable():
+        s = _WS_RE.sub(" ", s)
+    s = s.strip()
     if not s:
         return None
-    if s.lower() in EMPTY_TOKENS:
+    if len(s) <= _EMPTY_TOKENS_MAX_LEN and s.lower() in _EMPTY_TOKENS:
         return None
     return s
 
 
-def join_valid(values: Iterable[Optional[str]], sep: str = " ") -> Optional[str]:
-    parts: List[str] = []
-    for v in values:
-        nv = normalize_cell(v)
-        if nv is not None:
-            parts.append(nv)
-    if not parts:
-        return None
-    out = sep.join(parts)
-    out = re.sub(r"\s+", " ", out).strip()
-    return out or None
+@functools.lru_cache(maxsize=65536, typed=True)
+def _normalize_value(value) -> Optional[str]:
+    # typed=True: 1, 1.0 e True são chaves distintas ("1", "1" e "True")
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return _normalize_str(str(value))
 
 
-def get_group(ws, row: int, cols: list[str], sep: str = " ") -> Optional[str]:
-    vals = [ws[f"{c}{row}"].value for c in cols]
-    return join_valid(vals, sep=sep)
+def normalize_series(col: pd.Series) -> pd.Series:
+    """Normaliza uma coluna inteira de valores crus (vazio => NA)."""
+    return col.map(_normalize_value, na_action="ignore").astype("string")
 
 
-def row_has_any_data(ws, row: int) -> bool:
-    for c in ALL_RELEVANT_COLS:
-        v = normalize_cell(ws[f"{c}{row}"].value)
-        if v is not None:
-            return True
-    return False
+def join_columns(norm: pd.DataFrame, idx: Tuple[int, ...], sep: str = " ") -> pd.Series:
+    """Concatena as colunas já normalizadas ignorando vazios."""
+    first, *rest = (norm[i] for i in idx)
+    if not rest:
+        return first
+    # Só junta partes não vazias: sem separador sobrando, então não precisa de regex/strip
+    out = first
+    for s in rest:
+        both = out.notna() & s.notna()
+        out = (out + sep + s).where(both, out.fillna(s))
+    return out
 
 
-def row_has_footer_marker(ws, row: int) -> bool:
-    check_cols = ["A", "B", "C", "D", "E", "H", "M", "O", "T", "Z", "AA"]
-    texts: List[str] = []
-    for c in check_cols:
-        v = normalize_cell(ws[f"{c}{row}"].value)
-        if v:
-            texts.append(v.upper())
-    if not texts:
-        return False
-    joined = " | ".join(texts)
-    return any(k in joined for k in FOOTER_KEYWORDS)
+def find_footer_row(df: pd.DataFrame) -> Optional[int]:
+    """Posição (0-based) da primeira linha de rodapé, ou None.
+
+    Roda sobre os valores crus: as palavras-chave não têm espaços nem são EMPTY_TOKENS,
+    então a normalização não muda o resultado, e o que vem abaixo do rodapé nem é normalizado.
+    """
+    hits = pd.Series(False, index=df.index)
+    for i in FOOTER_CHECK_IDX:
+        text = df[i].astype("string").str.upper()
+        hits |= text.str.contains(_FOOTER_RE).fillna(False)
+    if not hits.any():
+        return None
+    return int(hits.to_numpy().argmax())
 
 
 def list_input_files() -> List[Path]:
     if not INPUT_DIR.exists():
         return []
+    # Um único os.walk (em vez de um rglob por extensão): cada diretório é lido uma vez
     files: List[Path] = []
-    for pattern in ("*.xls", "*.xlsx", "*.xlsm"):
-        for p in INPUT_DIR.rglob(pattern):
-            if p.name.startswith("~$"):
+    for root, _, names in os.walk(INPUT_DIR):
+        for name in names:
+            if name.startswith("~$"):
                 continue
-            files.append(p)
-    return sorted(set(files))
+            if os.path.splitext(name)[1].lower() in INPUT_EXTENSIONS:
+                files.append(Path(root) / name)
+    return sorted(files)
 
 
-def kill_excel_processes() -> None:
-    """Mata EXCEL.EXE para destravar conversões presas."""
-    # /F força, /IM filtra por nome do executável
+def kill_excel_process(pid: int) -> None:
+    """Mata só o Excel aberto pelo script (nunca os Excel do usuário) para destravar conversões presas."""
+    # /F força, /PID filtra pelo processo da instância criada em start_excel
     subprocess.run(
-        ["taskkill", "/F", "/IM", "EXCEL.EXE"],
+        ["taskkill", "/F", "/PID", str(pid)],
         stdout=subprocess.DEVNULL,
         stderr=subprocess.DEVNULL,
         shell=False,
@@ -175,72 +251,158 @@ def kill_excel_processes() -> None:
 # =========================
 # Conversão .xls -> .xlsx (com timeout)
 # =========================
-def convert_xls_to_xlsx(xls_path: Path) -> Path:
+def converted_path_for(xls_path: Path) -> Path:
+    return CONVERTED_DIR / (xls_path.stem + ".xlsx")
+
+
+def has_fresh_conversion(xls_path: Path) -> bool:
+    """Convertido existe e é mais novo que o .xls de origem (senão reconverte)."""
+    out_path = converted_path_for(xls_path)
+    try:
+        return out_path.stat().st_mtime_ns >= xls_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def convert_xls_to_xlsx_soffice(xls_paths: List[Path]) -> List[Path]:
+    """Converte em lote com LibreOffice headless (uma única inicialização do soffice).
+
+    Retorna os .xls que ficaram sem convertido (para cair no Excel/COM).
+    """
+    pending = [p for p in xls_paths if not has_fresh_conversion(p)]
+    if not pending or SOFFICE_BIN is None:
+        return pending
+
+    print(f"Convertendo {len(pending)} .xls com LibreOffice...")
     CONVERTED_DIR.mkdir(parents=True, exist_ok=True)
-    out_path = CONVERTED_DIR / (xls_path.stem + ".xlsx")
+    # Perfil descartável: não depende (nem trava) um LibreOffice já aberto pelo usuário,
+    # e um soffice.bin que sobreviva a um timeout não segura o lock do perfil padrão.
+    profile_dir = Path(tempfile.mkdtemp(prefix="soffice-profile-"))
+    try:
+        subprocess.run(
+            [
+                SOFFICE_BIN,
+                f"-env:UserInstallation={profile_dir.as_uri()}",
+                "--headless",
+                "--norestore",
+                "--convert-to",
+                "xlsx",
+                "--outdir",
+                str(CONVERTED_DIR),
+                *(str(p) for p in pending),
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=XLS_CONVERT_TIMEOUT_SEC * len(pending),
+            shell=False,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"   -> LibreOffice falhou ({e}); usando Excel para os restantes.")
+    finally:
+        shutil.rmtree(profile_dir, ignore_errors=True)
 
-    # Se já existe convertido, reaproveita
-    if out_path.exists():
-        return out_path
+    return [p for p in pending if not has_fresh_conversion(p)]
+
+
+def start_excel() -> Tuple[object, Optional[int]]:
+    """Abre uma instância do Excel (COM) para ser reaproveitada em todas as conversões.
 
+    Retorna (excel, pid); o PID é lido agora porque, com o Excel travado, nem o Hwnd responde.
+    """
     try:
         import win32com.client  # type: ignore
+        import win32process  # type: ignore
     except Exception as e:
         raise RuntimeError(
             "Para ler .xls, instale pywin32: python -m pip install pywin32"
         ) from e
 
-    # Garantia: não deixar excel antigo aberto travando
-    # (opcional, mas ajuda em lote)
-    # kill_excel_processes()
-
     excel = win32com.client.DispatchEx("Excel.Application")
     excel.Visible = False
     excel.DisplayAlerts = False
+    try:
+        _, pid = win32process.GetWindowThreadProcessId(excel.Hwnd)
+    except Exception:
+        pid = None
+    return excel, pid
 
-    started = time.time()
-    wb = None
 
+def quit_excel(excel) -> None:
     try:
-        # Open(..., UpdateLinks=0) evita prompts de links
-        wb = excel.Workbooks.Open(str(xls_path), UpdateLinks=0, ReadOnly=True)
-
-        # Timeout manual (COM pode travar sem levantar exceção)
-        while True:
-            if time.time() - started > XLS_CONVERT_TIMEOUT_SEC:
-                raise TimeoutError(f"Timeout convertendo .xls (> {XLS_CONVERT_TIMEOUT_SEC}s)")
-            # Se chegou aqui, workbook abriu — sai do loop
-            break
-
-        # 51 => .xlsx
-        wb.SaveAs(str(out_path), FileFormat=51)
-        wb.Close(SaveChanges=False)
-        wb = None
-
-    except TimeoutError:
-        # Mata excel travado
-        try:
-            if wb is not None:
-                wb.Close(SaveChanges=False)
-        except Exception:
-            pass
-        try:
-            excel.Quit()
-        except Exception:
-            pass
-        kill_excel_processes()
-        raise
+        excel.Quit()
+    except Exception:
+        pass
 
-    finally:
+
+def _open_and_save(stream, xls_path: Path, out_path: Path) -> None:
+    """Roda na thread de watchdog, com o seu próprio apartment COM."""
+    import pythoncom  # type: ignore
+    import win32com.client  # type: ignore
+
+    excel = wb = None
+    pythoncom.CoInitialize()
+    try:
+        excel = win32com.client.Dispatch(
+            pythoncom.CoGetInterfaceAndReleaseStream(stream, pythoncom.IID_IDispatch)
+        )
+        # Evita prompts: links, "somente leitura recomendado", notificação de arquivo em uso
+        wb = excel.Workbooks.Open(
+            str(xls_path),
+            UpdateLinks=0,
+            ReadOnly=True,
+            IgnoreReadOnlyRecommended=True,
+            Notify=False,
+        )
         try:
-            if wb is not None:
-                wb.Close(SaveChanges=False)
-        except Exception:
-            pass
+            # 51 => .xlsx
+            wb.SaveAs(str(out_path), FileFormat=51)
+        finally:
+            wb.Close(SaveChanges=False)
+    finally:
+        # Solta os proxies COM nesta thread antes do CoUninitialize (o traceback guardado
+        # em `errors` mantém este frame vivo, então zera as variáveis em vez de confiar no GC)
+        wb = excel = None
+        pythoncom.CoUninitialize()
+
+
+def convert_xls_to_xlsx(xls_path: Path, excel, excel_pid: Optional[int]) -> Path:
+    """Converte usando a instância `excel` já aberta (ver start_excel); não fecha o Excel."""
+    CONVERTED_DIR.mkdir(parents=True, exist_ok=True)
+    out_path = converted_path_for(xls_path)
+
+    # Se já existe convertido (e o .xls não mudou depois), reaproveita
+    if has_fresh_conversion(xls_path):
+        return out_path
+
+    import pythoncom  # type: ignore
+
+    # COM pode travar sem levantar exceção: o Open/SaveAs roda numa thread e a
+    # principal espera no máximo XLS_CONVERT_TIMEOUT_SEC.
+    stream = pythoncom.CoMarshalInterThreadInterfaceInStream(
+        pythoncom.IID_IDispatch, excel._oleobj_
+    )
+    # Thread daemon: se nem o kill destravar o COM, ela não segura a saída do interpretador
+    errors: List[BaseException] = []
+
+    def _run() -> None:
         try:
-            excel.Quit()
-        except Exception:
-            pass
+            _open_and_save(stream, xls_path, out_path)
+        except BaseException as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=_run, name=f"xls-{xls_path.name}", daemon=True)
+    worker.start()
+    worker.join(timeout=XLS_CONVERT_TIMEOUT_SEC)
+
+    if worker.is_alive():
+        # Mata o excel travado (destrava a thread; quem chamou deve abrir outro com start_excel)
+        if excel_pid is not None:
+            kill_excel_process(excel_pid)
+        out_path.unlink(missing_ok=True)
+        raise TimeoutError(f"Timeout convertendo .xls (> {XLS_CONVERT_TIMEOUT_SEC}s)")
+    if errors:
+        out_path.unlink(missing_ok=True)
+        raise errors[0]
 
     return out_path
 
@@ -248,72 +410,140 @@ def convert_xls_to_xlsx(xls_path: Path) -> Path:
 # =========================
 # Processamento
 # =========================
-def process_workbook(path_xlsx: Path, source_file_name: str) -> list[dict]:
-    wb = load_workbook(path_xlsx, data_only=True)
-    ws = wb.worksheets[0]
-
-    records: list[dict] = []
-    last_equip_tag: Optional[str] = None
-    last_equip_desc: Optional[str] = None
-
-    max_row = ws.max_row or START_ROW
-
-    for r in range(START_ROW, max_row + 1):
-        if row_has_footer_marker(ws, r):
-            break
-
-        if not row_has_any_data(ws, r):
-            continue
-
-        equip_tag = get_group(ws, r, COLS_EQUIP_TAG)
-        equip_desc = get_group(ws, r, COLS_EQUIP_DESC)
-
-        if equip_tag is None:
-            equip_tag = last_equip_tag
-        else:
-            last_equip_tag = equip_tag
-
-        if equip_desc is None:
-            equip_desc = last_equip_desc
-        else:
-            last_equip_desc = equip_desc
-
-        fonte_tag = get_group(ws, r, COLS_FONTE_TAG)  # vazio => None (null)
-        fonte_desc = get_group(ws, r, COLS_FONTE_DESC)
-        como_bloquear = get_group(ws, r, COLS_COMO_BLOQUEAR)
-        onde_bloquear = get_group(ws, r, COLS_ONDE_BLOQUEAR)
-        tipo_bloqueio = get_group(ws, r, COLS_TIPO_BLOQUEIO)
-        como_desbloquear = get_group(ws, r, COLS_COMO_DESBLOQUEAR)
-
-        record = {
-            "Arquivo de Origem": source_file_name,
-            "Tag do Equipamento": equip_tag,
-            "Descrição do Equipamento": equip_desc,
-            "Tag da Fonte de Energia": fonte_tag,
-            "Descrição da Fonte de Energia": fonte_desc,
-            "Como Bloquear": como_bloquear,
-            "Onde Bloquear / TAG": onde_bloquear,
-            "Tipo de Bloqueio": tipo_bloqueio,
-            "Como Desbloquear": como_desbloquear,
-        }
-
-        has_source_info = any(
-            record[k] is not None
-            for k in [
-                "Tag da Fonte de Energia",
-                "Descrição da Fonte de Energia",
-                "Como Bloquear",
-                "Onde Bloquear / TAG",
-                "Tipo de Bloqueio",
-                "Como Desbloquear",
-            ]
+def read_sheet(path_xlsx: Path) -> pd.DataFrame:
+    """Lê a 1ª aba a partir de START_ROW, só com as colunas usadas (rótulo = índice 0-based).
+
+    Lido direto com openpyxl (read_only + values_only) e não com pd.read_excel: células de
+    erro (#N/A, #REF!...) chegam como texto e contam como dado, em vez de virarem vazio
+    (o que faria o fill down herdar o equipamento da linha anterior).
+    """
+    wb = load_workbook(path_xlsx, data_only=True, read_only=True)
+    try:
+        rows = list(
+            wb.worksheets[0].iter_rows(min_row=START_ROW, max_col=MAX_COL, values_only=True)
         )
-        if not has_source_info:
-            continue
+    finally:
+        wb.close()
+    return pd.DataFrame(rows, dtype=object).reindex(columns=list(NORMALIZED_IDX))
+
+
+def process_workbook(path_xlsx: Path, source_file_name: str) -> pa.Table:
+    df = read_sheet(path_xlsx)
+
+    # Descarta linhas espaçadoras (todas as células vazias) antes de normalizar: checagem barata, sem regex
+    df = df[~(df.isna() | df.eq("")).all(axis=1)]
+
+    # Rodapé detectado uma única vez; daqui pra frente só as linhas de dados
+    footer = find_footer_row(df)
+    if footer is not None:
+        df = df.iloc[:footer]
+
+    # Normalização vetorizada, coluna a coluna
+    norm = pd.DataFrame({c: normalize_series(df[c]) for c in df.columns}, index=df.index)
+
+    # Colunar: cada coluna de saída vira um array Arrow (sem passar por dict/lista por linha)
+    equip_tag = join_columns(norm, EQUIP_TAG_IDX).ffill()
+    equip_desc = join_columns(norm, EQUIP_DESC_IDX).ffill()
+    fonte_tag = join_columns(norm, FONTE_TAG_IDX)  # vazio => None (null)
+    fonte_desc = join_columns(norm, FONTE_DESC_IDX)
+    como_bloquear = join_columns(norm, COMO_BLOQUEAR_IDX)
+    onde_bloquear = join_columns(norm, ONDE_BLOQUEAR_IDX)
+    tipo_bloqueio = join_columns(norm, TIPO_BLOQUEIO_IDX)
+    como_desbloquear = join_columns(norm, COMO_DESBLOQUEAR_IDX)
+
+    has_source_info = (
+        fonte_tag.notna()
+        | fonte_desc.notna()
+        | como_bloquear.notna()
+        | onde_bloquear.notna()
+        | tipo_bloqueio.notna()
+        | como_desbloquear.notna()
+    )
 
-        records.append(record)
+    columns = [
+        equip_tag,
+        equip_desc,
+        fonte_tag,
+        fonte_desc,
+        como_bloquear,
+        onde_bloquear,
+        tipo_bloqueio,
+        como_desbloquear,
+    ]
+    n = int(has_source_info.sum())
+    arrays = [pa.array([source_file_name] * n, type=pa.string())] + [
+        pa.array(c[has_source_info], type=pa.string(), from_pandas=True) for c in columns
+    ]
+    return pa.Table.from_arrays(arrays, schema=OUTPUT_SCHEMA)
 
-    return records
+
+# =========================
+# Saída
+# =========================
+def append_table(ws, table: pa.Table) -> None:
+    ws.append(table.column_names)
+    # Um record batch por vez: só o lote atual vira objeto Python (nulos => None => célula vazia)
+    for batch in table.to_batches():
+        for row in zip(*(c.to_pylist() for c in batch.columns)):
+            ws.append(row)
+
+
+# =========================
+# Cache (Parquet) dos dados extraídos
+# =========================
+def cache_path_for(path: Path, source_file_name: str) -> Path:
+    st = path.stat()
+    raw = f"{CACHE_VERSION}|{path.resolve()}|{source_file_name}|{st.st_mtime_ns}|{st.st_size}"
+    key = hashlib.blake2b(raw.encode()).hexdigest()[:16]
+    return CACHE_DIR / f"{key}.parquet"
+
+
+def load_cached(cache: Path) -> Optional[pa.Table]:
+    if not cache.exists():
+        return None
+    try:
+        table = pq.read_table(cache)
+    except Exception:
+        return None  # cache corrompido: reprocessa
+    if not table.schema.equals(OUTPUT_SCHEMA):
+        return None
+    return table
+
+
+def save_cached(cache: Path, table: pa.Table) -> None:
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = cache.with_suffix(".tmp")
+        pq.write_table(table, tmp, compression="zstd")
+        tmp.replace(cache)
+    except Exception:
+        pass  # cache é só otimização
+
+
+def prune_cache(keep: set[Path]) -> None:
+    """Apaga do .cache/ o que não corresponde a nenhum arquivo desta execução (versões antigas)."""
+    if not CACHE_DIR.exists():
+        return
+    for p in CACHE_DIR.iterdir():
+        if p.suffix in (".parquet", ".tmp") and p not in keep:
+            try:
+                p.unlink()
+            except OSError:
+                pass
+
+
+def _process_one(job: Tuple[Path, str]) -> Tuple[str, Optional[pa.Table], Optional[str]]:
+    """Executado nos processos filhos: nunca levanta, devolve o erro como texto."""
+    path, source_file_name = job
+    try:
+        cache = cache_path_for(path, source_file_name)
+        recs = load_cached(cache)
+        if recs is None:
+            recs = process_workbook(path, source_file_name=source_file_name)
+            save_cached(cache, recs)
+        return source_file_name, recs, None
+    except Exception as e:
+        return source_file_name, None, str(e)
 
 
 # =========================
@@ -330,57 +560,100 @@ def main() -> None:
     if not files:
         raise SystemExit(f"Nenhum .xls/.xlsx/.xlsm encontrado em: {INPUT_DIR}")
 
-    all_records: list[dict] = []
     processed = 0
     converted = 0
-    failed: List[Tuple[str, str]] = []
+    # Erros por posição do arquivo em `files`: a aba "Erros" sai sempre na mesma ordem
+    errors: dict[int, Tuple[str, str]] = {}
 
     total = len(files)
     print(f"Encontrados {total} arquivos. Iniciando processamento...")
 
-    for i, f in enumerate(files, start=1):
-        print(f"[{i}/{total}] Processando: {f.name}")
+    xls_files = [f for f in files if f.suffix.lower() == ".xls"]
+    if xls_files and SOFFICE_BIN is not None:
+        convert_xls_to_xlsx_soffice(xls_files)
 
-        try:
-            if f.suffix.lower() == ".xls":
-                xlsx_path = convert_xls_to_xlsx(f)
+    # 1) Conversão .xls (serial: Excel/COM não é paralelizável)
+    #    Uma única instância do Excel para o lote todo, aberta só se precisar
+    jobs: List[Tuple[Path, str]] = []
+    job_file_pos: List[int] = []
+    excel = excel_pid = None
+    try:
+        xls_done = 0
+        for file_pos, f in enumerate(files):
+            if f.suffix.lower() != ".xls":
+                jobs.append((f, f.name))
+                job_file_pos.append(file_pos)
+                continue
+            xls_done += 1
+            print(f"[{xls_done}/{len(xls_files)}] Convertendo: {f.name}")
+            try:
+                if excel is None and not has_fresh_conversion(f):
+                    excel, excel_pid = start_excel()
+                jobs.append((convert_xls_to_xlsx(f, excel, excel_pid), f.name))
+                job_file_pos.append(file_pos)
                 converted += 1
-                recs = process_workbook(xlsx_path, source_file_name=f.name)
-            else:
-                recs = process_workbook(f, source_file_name=f.name)
-
-            all_records.extend(recs)
+            except Exception as e:
+                errors[file_pos] = (f.name, str(e))
+                print(f"   -> ERRO convertendo {f.name}: {e}")
+                # Excel pode ter travado/morrido: descarta e abre outro no próximo .xls
+                if excel is not None:
+                    quit_excel(excel)
+                    excel = excel_pid = None
+    finally:
+        if excel is not None:
+            quit_excel(excel)
+
+    # 2) Leitura das planilhas em paralelo (um processo por núcleo)
+    #    Cada arquivo é um future: se um processo filho morrer (BrokenProcessPool),
+    #    só os arquivos afetados vão para "Erros" e o resto segue.
+    results: dict[int, pa.Table] = {}
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {ex.submit(_process_one, job): pos for pos, job in enumerate(jobs)}
+        for i, fut in enumerate(as_completed(futures), start=1):
+            pos = futures[fut]
+            name = jobs[pos][1]
+            print(f"[{i}/{len(jobs)}] Processado: {name}")
+            try:
+                _, recs, err = fut.result()
+            except Exception as e:
+                recs, err = None, f"{type(e).__name__}: {e}"
+            if err is not None:
+                errors[job_file_pos[pos]] = (name, err)
+                print(f"   -> ERRO: {err}")
+                continue
+            results[pos] = recs
             processed += 1
 
-        except Exception as e:
-            failed.append((f.name, str(e)))
-            print(f"   -> ERRO: {e}")
-
-    df = pd.DataFrame(
-        all_records,
-        columns=[
-            "Arquivo de Origem",
-            "Tag do Equipamento",
-            "Descrição do Equipamento",
-            "Tag da Fonte de Energia",
-            "Descrição da Fonte de Energia",
-            "Como Bloquear",
-            "Onde Bloquear / TAG",
-            "Tipo de Bloqueio",
-            "Como Desbloquear",
-        ],
-    )
+    # Cada arquivo editado (ou CACHE_VERSION novo) gera outra chave: descarta as que sobraram
+    live_cache: set[Path] = set()
+    for path, name in jobs:
+        try:
+            live_cache.add(cache_path_for(path, name))
+        except OSError:
+            pass
+    prune_cache(live_cache)
+
+    # Mantém a ordem dos arquivos na saída, independente da ordem de término
+    tables = [results[pos] for pos in sorted(results)]
+    failed = [errors[pos] for pos in sorted(errors)]
 
-    with pd.ExcelWriter(OUTPUT_FILE, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Consolidado")
-        if failed:
-            df_err = pd.DataFrame(failed, columns=["Arquivo", "Erro"])
-            df_err.to_excel(writer, index=False, sheet_name="Erros")
+    # concat_tables só encadeia os chunks de cada arquivo (sem cópia); strings ficam em Arrow
+    big = pa.concat_tables(tables) if tables else OUTPUT_SCHEMA.empty_table()
+
+    # write_only: grava as linhas em streaming, sem montar o grafo de Cell em memória
+    wb = Workbook(write_only=True)
+    append_table(wb.create_sheet("Consolidado"), big)
+    if failed:
+        ws_err = wb.create_sheet("Erros")
+        ws_err.append(["Arquivo", "Erro"])
+        for row in failed:
+            ws_err.append(row)
+    wb.save(OUTPUT_FILE)
 
     print("\nFINALIZADO")
     print(f"OK! Gerado: {OUTPUT_FILE}")
     print(f"Arquivos encontrados: {total} | Processados: {processed} | Convertidos: {converted} | Falharam: {len(failed)}")
-    print(f"Linhas consolidadas: {len(df)}")
+    print(f"Linhas consolidadas: {big.num_rows}")
     if failed:
         print("Obs: veja a aba 'Erros' para detalhes.")
 